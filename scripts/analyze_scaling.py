@@ -1,58 +1,271 @@
 #!/usr/bin/env python3
+import hashlib
+import io
+import os
 import pandas as pd
 import numpy as np
-from scipy import stats
 import sys
+from pathlib import Path
 
-csv_file = sys.argv[1]
-# Robust reading: handle potential type inference issues
-df = pd.read_csv(csv_file, dtype={'magnitude': str})
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # Fall back to the pandas C parser
+    pacsv = None
+
+# Explicit dtypes for the columns the analysis reads, so the parser skips
+# type inference and ignores everything else. Magnitude and target stay
+# strings: magnitude holds labels such as "1e4", and targets can be
+# semiprimes too large for any integer dtype (they are only printed).
+DTYPES = {
+    'magnitude': str,
+    'target': str,
+    'arraySize': 'int64',
+    'meanSteps': 'float64',
+    'stepsPerElement': 'float64',
+    'convergenceRate': 'float64',
+}
+REQUIRED_COLS = list(DTYPES)
+CHUNK_SIZE = 500_000
+ARROW_BLOCK_SIZE = 64 << 20
+CACHE_DIR = (Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+             / 'emergent-doom' / 'analyze')
+
+
+def open_chunks(csv_file):
+    """Return an iterator of DataFrame chunks holding the DTYPES columns.
+
+    Uses PyArrow's streaming CSV reader when it is installed, otherwise the
+    pandas C parser. Both are single-threaded; the PyArrow path is only
+    modestly faster, but keeps memory bounded by the block size.
+    """
+    if pacsv is not None:
+        column_types = {
+            col: pa.string() if dtype is str else pa.from_numpy_dtype(np.dtype(dtype))
+            for col, dtype in DTYPES.items()
+        }
+        batches = pacsv.open_csv(
+            csv_file,
+            read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+            convert_options=pacsv.ConvertOptions(column_types=column_types,
+                                                 include_columns=REQUIRED_COLS),
+        )
+        return (batch.to_pandas() for batch in batches)
+    return pd.read_csv(csv_file, chunksize=CHUNK_SIZE, usecols=REQUIRED_COLS,
+                       dtype=DTYPES, engine='c')
+
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Combine two (count, mean, M2) summaries with the parallel Welford update.
+
+    Either side may be empty (count 0, mean and M2 0).
+    """
+    w = n_b / np.maximum(n_a + n_b, 1)
+    delta = mean_b - mean_a
+    return mean_a + delta * w, m2_a + m2_b + delta * delta * n_a * w
+
+
+def merge_comoment(n_a, mean_xa, mean_ya, c_a, n_b, mean_xb, mean_yb, c_b):
+    """Combine two centred co-moments sum((x - mean_x) * (y - mean_y)) the same way."""
+    w = n_b / np.maximum(n_a + n_b, 1)
+    return c_a + c_b + (mean_xb - mean_xa) * (mean_yb - mean_ya) * n_a * w
+
+
+def reduce_chunk(converged, buf):
+    """Per-magnitude regression and steps/n moments for one chunk.
+
+    Rows are stably sorted by magnitude (in first-seen order) so that each
+    group is a contiguous slice reduced with np.add.reduceat. Repeated group
+    means, products and squares are formed in buf, a float64 scratch array
+    of the chunk's length, and deviations overwrite the sorted column copies
+    in place; those copies, the sort bookkeeping and the missing-value mask
+    are still allocated per chunk.
+    """
+    codes, magnitudes = pd.factorize(converged['magnitude'])
+    order = np.argsort(codes, kind='stable')
+    group = codes[order]  # Group number of each sorted row
+    _, starts, counts = np.unique(group, return_index=True, return_counts=True)
+    x = converged['arraySize'].to_numpy(np.float64)[order]
+    y = converged['meanSteps'].to_numpy()[order]
+    ratio = converged['stepsPerElement'].to_numpy()[order]
+
+    mean_x = np.add.reduceat(x, starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+    x -= np.take(mean_x, group, out=buf)
+    y -= np.take(mean_y, group, out=buf)
+    cxx = np.add.reduceat(np.multiply(x, x, out=buf), starts)
+    cxy = np.add.reduceat(np.multiply(x, y, out=buf), starts)
+    cyy = np.add.reduceat(np.multiply(y, y, out=buf), starts)
+
+    # Missing steps/n values are skipped, like Series.mean()/std()
+    has_ratio = ~np.isnan(ratio)
+    n_ratio = np.add.reduceat(has_ratio, starts, dtype=np.int64)
+    np.nan_to_num(ratio, copy=False, nan=0.0)
+    mean_ratio = np.add.reduceat(ratio, starts) / np.maximum(n_ratio, 1)
+    ratio -= np.take(mean_ratio, group, out=buf)
+    ratio *= has_ratio
+    ratio_m2 = np.add.reduceat(np.square(ratio, out=ratio), starts)
+    return pd.DataFrame({
+        'n': counts,
+        'mean_x': mean_x,
+        'mean_y': mean_y,
+        'cxx': cxx,
+        'cxy': cxy,
+        'cyy': cyy,
+        'n_ratio': n_ratio,
+        'mean_ratio': mean_ratio,
+        'ratio_m2': ratio_m2,
+        'target': converged['target'].to_numpy()[order[starts]],
+    }, index=magnitudes)
 
-print("=== SCALING VERIFICATION ANALYSIS ===\n")
 
-# Filter out non-converged rows for regression
-converged_df = df[df['convergenceRate'] > 0].copy()
+def merge_parts(acc, parts):
+    """Fold one chunk's per-magnitude partials into the running accumulator.
 
-if converged_df.empty:
-    print("No converged trials found in CSV.")
+    Magnitudes keep first-seen order; the merge is evaluated for every
+    magnitude at once.
+    """
+    index = acc.index.append(parts.index).unique()
+    a = acc.drop(columns='target').reindex(index, fill_value=0)
+    b = parts.drop(columns='target').reindex(index, fill_value=0)
+    merged = pd.DataFrame({'n': a['n'] + b['n'], 'n_ratio': a['n_ratio'] + b['n_ratio']})
+    merged['cxy'] = merge_comoment(
+        a['n'], a['mean_x'], a['mean_y'], a['cxy'],
+        b['n'], b['mean_x'], b['mean_y'], b['cxy'],
+    )
+    merged['mean_x'], merged['cxx'] = merge_moments(
+        a['n'], a['mean_x'], a['cxx'], b['n'], b['mean_x'], b['cxx'],
+    )
+    merged['mean_y'], merged['cyy'] = merge_moments(
+        a['n'], a['mean_y'], a['cyy'], b['n'], b['mean_y'], b['cyy'],
+    )
+    merged['mean_ratio'], merged['ratio_m2'] = merge_moments(
+        a['n_ratio'], a['mean_ratio'], a['ratio_m2'],
+        b['n_ratio'], b['mean_ratio'], b['ratio_m2'],
+    )
+    merged['target'] = acc['target'].reindex(index).fillna(parts['target'].reindex(index))
+    return merged
+
+
+def cache_path(csv_file):
+    """Cache file for the report on csv_file.
+
+    Keyed on the CSV's path, mtime, size and first 4 KB, plus this script's
+    mtime so edits to the analysis invalidate old reports.
+    """
+    st = os.stat(csv_file)
+    key = hashlib.sha256(
+        f"{os.path.abspath(csv_file)}|{st.st_mtime_ns}|{st.st_size}|"
+        f"{os.stat(__file__).st_mtime_ns}".encode()
+    )
+    with open(csv_file, 'rb') as f:
+        key.update(f.read(4096))
+    return CACHE_DIR / f"{key.hexdigest()}.txt"
+
+
+def write_report(text, cached):
+    """Write the report to stdout and store it in the cache."""
+    sys.stdout.write(text)
+    try:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, cached)
+    except OSError:
+        pass  # Caching is best-effort
+
+
+csv_file = sys.argv[1]
+# Re-running on an unchanged CSV replays the stored report
+cached = cache_path(csv_file)
+if cached.exists():
+    sys.stdout.write(cached.read_text(encoding='utf-8'))
     sys.exit(0)
 
-for magnitude in converged_df['magnitude'].unique():
-    subset = converged_df[converged_df['magnitude'] == magnitude]
+# Fail fast on a malformed header before parsing the body
+header = pd.read_csv(csv_file, nrows=0).columns
+missing = [col for col in REQUIRED_COLS if col not in header]
+if missing:
+    print(f"Missing required columns in {csv_file}: {missing}")
+    sys.exit(1)
 
-    print(f"Magnitude {magnitude}:")
-    print(f"  Target: {subset['target'].iloc[0]}")
+# Stream the CSV in chunks, folding each chunk into per-magnitude running
+# means and centred co-moments (for the regression) and steps/n moments,
+# plus running (magnitude, arraySize) totals for the cross-magnitude table,
+# so memory grows with the number of groups rather than the file size.
+reader = open_chunks(csv_file)
 
-    # Linear regression: steps ~ a*n + b
-    if len(subset) >= 2:
-        slope, intercept, r_value, p_value, std_err = stats.linregress(
-            subset['arraySize'], subset['meanSteps']
-        )
+acc = None
+rates = None
+buf = np.empty(0)  # Scratch space reused across chunks, grown on demand
+for chunk in reader:
+    # Filter out non-converged rows for regression
+    converged = chunk[chunk['convergenceRate'] > 0]
+    if len(buf) < len(converged):
+        buf = np.empty(len(converged))
+    parts = reduce_chunk(converged, buf[:len(converged)])
+    acc = parts if acc is None else merge_parts(acc, parts)
+
+    rate_part = chunk.groupby(['magnitude', 'arraySize'])['convergenceRate'].agg(['sum', 'count'])
+    rates = rate_part if rates is None else rates.add(rate_part, fill_value=0)
+
+# Build the report in memory and write it to stdout once at the end
+report = io.StringIO()
+print("=== SCALING VERIFICATION ANALYSIS ===\n", file=report)
+
+if acc is None or acc.empty:
+    print("No converged trials found in CSV.", file=report)
+    write_report(report.getvalue(), cached)
+    sys.exit(0)
+
+# Linear regression per magnitude: steps ~ a*n + b, in first-seen order.
+# The closed-form fit is evaluated from the accumulated moments for every
+# magnitude at once.
+fits = acc
+n = fits['n']
+cxx, cxy, cyy = fits['cxx'], fits['cxy'], fits['cyy']
+fits['slope'] = cxy / cxx
+fits['intercept'] = fits['mean_y'] - fits['slope'] * fits['mean_x']
+# Clamped so exactly collinear points cannot round to a negative residual
+resid = (cxx * cyy - cxy ** 2).clip(lower=0)
+fits['r_squared'] = (1 - resid / (cxx * cyy)).where(cyy > 0, 0.0)
+# Matches scipy.stats.linregress, which reports 0 for a two-point fit
+fits['std_err'] = np.sqrt(resid / cxx ** 2 / (n - 2)).where(n > 2, 0.0)
+# Steps/n statistics only count rows that have a value, like Series.mean()/std()
+fits['mean_ratio'] = fits['mean_ratio'].where(fits['n_ratio'] > 0)
+fits['std_ratio'] = np.sqrt(fits['ratio_m2'] / (fits['n_ratio'] - 1)).where(fits['n_ratio'] > 1)
 
-        print(f"\n  Linear fit: steps = {slope:.4f}*n + {intercept:.2f}")
-        print(f"  R² = {r_value**2:.6f} (1.0 = perfect linear)")
-        print(f"  Slope std error: ±{std_err:.4f}")
+for fit in fits.itertuples():
+    print(f"Magnitude {fit.Index}:", file=report)
+    print(f"  Target: {fit.target}", file=report)
+
+    if fit.n >= 2:
+        print(f"\n  Linear fit: steps = {fit.slope:.4f}*n + {fit.intercept:.2f}", file=report)
+        print(f"  R² = {fit.r_squared:.6f} (1.0 = perfect linear)", file=report)
+        print(f"  Slope std error: ±{fit.std_err:.4f}", file=report)
 
         # Steps/n ratio stability
-        mean_ratio = subset['stepsPerElement'].mean()
-        std_ratio = subset['stepsPerElement'].std()
+        mean_ratio = fit.mean_ratio
+        std_ratio = fit.std_ratio
         cv_ratio = (std_ratio / mean_ratio * 100) if mean_ratio > 0 else 0
 
-        print(f"\n  Steps/n ratio: {mean_ratio:.4f} ± {std_ratio:.4f}")
-        print(f"  Coefficient of variation: {cv_ratio:.2f}%")
+        print(f"\n  Steps/n ratio: {mean_ratio:.4f} ± {std_ratio:.4f}", file=report)
+        print(f"  Coefficient of variation: {cv_ratio:.2f}%", file=report)
 
         if cv_ratio < 10:
-            print("  ✓ STRONG O(n) evidence (ratio stable)")
+            print("  ✓ STRONG O(n) evidence (ratio stable)", file=report)
         elif cv_ratio < 20:
-            print("  ~ MODERATE O(n) evidence (some variation)")
+            print("  ~ MODERATE O(n) evidence (some variation)", file=report)
         else:
-            print("  ✗ WEAK O(n) evidence (high variation)")
+            print("  ✗ WEAK O(n) evidence (high variation)", file=report)
     else:
-        print("  Insufficient data points for regression.")
+        print("  Insufficient data points for regression.", file=report)
 
-    print("\n" + "="*60 + "\n")
+    print("\n" + "="*60 + "\n", file=report)
 
 # Cross-magnitude comparison
-print("CROSS-MAGNITUDE ANALYSIS:")
-pivot = df.groupby(['magnitude', 'arraySize'])['convergenceRate'].mean().unstack()
-print(pivot)
+print("CROSS-MAGNITUDE ANALYSIS:", file=report)
+pivot = (rates['sum'] / rates['count']).unstack()
+print(pivot, file=report)
+
+write_report(report.getvalue(), cached)